@@ -1,11 +1,30 @@
 # mypy: disable - error - code = "no-untyped-def,misc"
 import pathlib
+import sys
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request, Response
 from fastapi.staticfiles import StaticFiles
 import fastapi.exceptions
+from fastapi.exception_handlers import http_exception_handler
+
+GRAPH_PATH = pathlib.Path(__file__).with_name("graph.py").resolve()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Release the shared Gemini client's connection pool on shutdown."""
+    yield
+    # langgraph-api loads graph.py by file path under its own module name, so
+    # look up whichever copies are loaded instead of importing a new one here
+    for module in list(sys.modules.values()):
+        module_file = getattr(module, "__file__", None)
+        if module_file and pathlib.Path(module_file).resolve() == GRAPH_PATH:
+            await module.genai_client.aio.aclose()
+
 
 # Define the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 def create_frontend_router(build_dir="../frontend/dist"):
@@ -18,7 +37,6 @@ def create_frontend_router(build_dir="../frontend/dist"):
         A Starlette application serving the frontend.
     """
     build_path = pathlib.Path(__file__).parent.parent.parent / build_dir
-    static_files_path = build_path / "assets"  # Vite uses 'assets' subdir
 
     if not build_path.is_dir() or not (build_path / "index.html").is_file():
         print(
@@ -36,19 +54,20 @@ def create_frontend_router(build_dir="../frontend/dist"):
 
         return Route("/{path:path}", endpoint=dummy_frontend)
 
-    build_dir = pathlib.Path(build_dir)
+    index_path = build_path / "index.html"
 
+    # Serve the whole build (including Vite's 'assets' subdir) straight from disk
     react = FastAPI(openapi_url="")
-    react.mount(
-        "/assets", StaticFiles(directory=static_files_path), name="static_assets"
-    )
-
-    @react.get("/{path:path}")
-    async def handle_catch_all(request: Request, path: str):
-        fp = build_path / path
-        if not fp.exists() or not fp.is_file():
-            fp = build_path / "index.html"
-        return fastapi.responses.FileResponse(fp)
+    react.mount("/", StaticFiles(directory=build_path, html=True), name="frontend_root")
+
+    # Unknown extensionless paths are client-side routes, so hand them back to the
+    # SPA; missing files (e.g. a stale /assets/*.js) keep their real 404
+    @react.exception_handler(404)
+    async def handle_not_found(request: Request, exc: Exception):
+        path = pathlib.PurePosixPath(request.url.path)
+        if path.suffix or "assets" in path.parts:
+            return await http_exception_handler(request, exc)
+        return fastapi.responses.FileResponse(index_path)
 
     return react
 
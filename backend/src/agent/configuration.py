@@ -1,3 +1,4 @@
+import functools
 import os
 from pydantic import BaseModel, Field
 from typing import Any, Optional
@@ -39,6 +40,20 @@ class Configuration(BaseModel):
         metadata={"description": "The maximum number of research loops to perform."},
     )
 
+    @classmethod
+    @functools.cache
+    def environment_values(cls) -> dict[str, str]:
+        """Read the environment overrides for the configuration fields.
+
+        The environment is read once per process, on first use, instead of on every
+        node call; the returned dict must not be modified.
+        """
+        return {
+            name: os.environ[name.upper()]
+            for name in cls.model_fields.keys()
+            if name.upper() in os.environ
+        }
+
     @classmethod
     def from_runnable_config(
         cls, config: Optional[RunnableConfig] = None
@@ -49,8 +64,9 @@ class Configuration(BaseModel):
         )
 
         # Get raw values from environment or config
+        env_values = cls.environment_values()
         raw_values: dict[str, Any] = {
-            name: os.environ.get(name.upper(), configurable.get(name))
+            name: env_values.get(name, configurable.get(name))
             for name in cls.model_fields.keys()
         }
 
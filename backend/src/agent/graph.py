@@ -1,43 +1,96 @@
+import asyncio
+import functools
 import os
 
+import httpx
 from agent.tools_and_schemas import SearchQueryList, Reflection
 from dotenv import load_dotenv
-from langchain_core.messages import AIMessage
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langgraph.types import Send
 from langgraph.graph import StateGraph
 from langgraph.graph import START, END
 from langchain_core.runnables import RunnableConfig
-from google.genai import Client
+from google.genai import Client, types
 
 from agent.state import (
     OverallState,
     QueryGenerationState,
-    ReflectionState,
     WebSearchState,
 )
 from agent.configuration import Configuration
 from agent.prompts import (
     get_current_date,
-    query_writer_instructions,
-    web_searcher_instructions,
-    reflection_instructions,
-    answer_instructions,
+    render_query_writer,
+    render_query_writer_input,
+    render_web_searcher,
+    render_web_searcher_input,
+    render_reflection,
+    render_reflection_input,
+    render_answer,
+    render_answer_input,
 )
 from langchain_google_genai import ChatGoogleGenerativeAI
 from agent.utils import (
     get_citations,
     get_research_topic,
     insert_citation_markers,
+    number_research_topics,
+    replace_short_urls,
     resolve_urls,
+    split_research_topics,
 )
 
 load_dotenv()
 
-if os.getenv("GEMINI_API_KEY") is None:
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+if GEMINI_API_KEY is None:
     raise ValueError("GEMINI_API_KEY is not set")
 
-# Used for Google Search API
-genai_client = Client(api_key=os.getenv("GEMINI_API_KEY"))
+# Used for Google Search API. Created once per process so every node call reuses the
+# same connection pool; the FastAPI lifespan in app.py closes it on shutdown. The
+# async transport speaks HTTP/2, so concurrent calls are multiplexed over a few
+# pooled connections instead of opening a socket (and TLS handshake) per request.
+genai_client = Client(
+    api_key=GEMINI_API_KEY,
+    http_options=types.HttpOptions(
+        async_client_args={
+            "http2": True,
+            "limits": httpx.Limits(max_connections=100, max_keepalive_connections=50),
+        }
+    ),
+)
+
+
+@functools.lru_cache(maxsize=8)
+def get_chat_llm(model: str, temperature: float) -> ChatGoogleGenerativeAI:
+    """Return the shared chat model client for a model and temperature."""
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=temperature,
+        max_retries=2,
+        api_key=GEMINI_API_KEY,
+    )
+
+
+@functools.lru_cache(maxsize=8)
+def get_structured_llm(model: str, temperature: float, schema: type):
+    """Return the shared chat model client bound to a structured output schema."""
+    return get_chat_llm(model, temperature).with_structured_output(schema)
+
+
+# Model outputs longer than this are post-processed in a worker thread so that the
+# citation regex and string rebuilding do not stall the event loop for other runs.
+LARGE_OUTPUT_CHARS = 8192
+
+# Prompts built from more research summaries than this are assembled in a worker thread.
+LARGE_PROMPT_CHARS = 50_000
+
+
+async def run_post_processing(func, text: str, *args):
+    """Run a text post-processing step, off the event loop if the text is large."""
+    if len(text) > LARGE_OUTPUT_CHARS:
+        return await asyncio.to_thread(func, text, *args)
+    return func(text, *args)
 
 
 # Nodes
@@ -61,61 +114,71 @@ def generate_query(state: OverallState, config: RunnableConfig) -> QueryGenerati
         state["initial_search_query_count"] = configurable.number_of_initial_queries
 
     # init Gemini 2.0 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=configurable.query_generator_model,
-        temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+    structured_llm = get_structured_llm(
+        configurable.query_generator_model, 1.0, SearchQueryList
     )
-    structured_llm = llm.with_structured_output(SearchQueryList)
 
-    # Format the prompt
+    # Format the prompt. The static instructions go first as the system message so
+    # the prompt prefix stays byte-identical across calls for Gemini's prefix caching.
     current_date = get_current_date()
-    formatted_prompt = query_writer_instructions.format(
-        current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
-        number_queries=state["initial_search_query_count"],
-    )
+    messages = [
+        SystemMessage(
+            content=render_query_writer(
+                number_queries=state["initial_search_query_count"],
+                current_date=current_date,
+            )
+        ),
+        HumanMessage(
+            content=render_query_writer_input(
+                research_topic=get_research_topic(state["messages"]),
+            )
+        ),
+    ]
     # Generate the search queries
-    result = structured_llm.invoke(formatted_prompt)
+    result = structured_llm.invoke(messages)
     return {"query_list": result.query}
 
 
-def continue_to_web_research(state: QueryGenerationState):
+def continue_to_web_research(state: OverallState):
     """LangGraph node that sends the search queries to the web research node.
 
-    This is used to spawn n number of web research nodes, one for each search query.
+    All queries are sent as a single batch so that web research issues one grounded
+    Gemini call per research loop instead of one call per query. Without any queries
+    there is nothing to research, so the answer is finalized straight away.
     """
-    return [
-        Send("web_research", {"search_query": search_query, "id": int(idx)})
-        for idx, search_query in enumerate(state["query_list"])
-    ]
+    if not state["query_list"]:
+        return "finalize_answer"
+    return [Send("web_research", {"search_queries": state["query_list"], "id": 0})]
 
 
-def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
+async def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
     """LangGraph node that performs web research using the native Google Search API tool.
 
-    Executes a web search using the native Google Search API tool in combination with Gemini 2.0 Flash.
+    Researches a batch of search queries with a single call to the native Google Search API
+    tool in combination with Gemini 2.0 Flash, then splits the grounded answer back into one
+    summary per query.
 
     Args:
-        state: Current graph state containing the search query and research loop count
+        state: Current graph state containing the batch of search queries and its id
         config: Configuration for the runnable, including search API settings
 
     Returns:
-        Dictionary with state update, including sources_gathered, research_loop_count, and web_research_results
+        Dictionary with state update, including sources_gathered, search_query, and web_research_results
     """
     # Configure
     configurable = Configuration.from_runnable_config(config)
-    formatted_prompt = web_searcher_instructions.format(
-        current_date=get_current_date(),
-        research_topic=state["search_query"],
+    instructions = render_web_searcher(current_date=get_current_date())
+    formatted_prompt = render_web_searcher_input(
+        research_topics=number_research_topics(state["search_queries"]),
     )
 
-    # Uses the google genai client as the langchain client doesn't return grounding metadata
-    response = genai_client.models.generate_content(
+    # Uses the google genai client as the langchain client doesn't return grounding metadata.
+    # The async client keeps the event loop free while the search is in flight.
+    response = await genai_client.aio.models.generate_content(
         model=configurable.query_generator_model,
         contents=formatted_prompt,
         config={
+            "system_instruction": instructions,
             "tools": [{"google_search": {}}],
             "temperature": 0,
         },
@@ -126,17 +189,19 @@ def web_research(state: WebSearchState, config: RunnableConfig) -> OverallState:
     )
     # Gets the citations and adds them to the generated text
     citations = get_citations(response, resolved_urls)
-    modified_text = insert_citation_markers(response.text, citations)
+    modified_text = await run_post_processing(
+        insert_citation_markers, response.text, citations
+    )
     sources_gathered = [item for citation in citations for item in citation["segments"]]
 
     return {
         "sources_gathered": sources_gathered,
-        "search_query": [state["search_query"]],
-        "web_research_result": [modified_text],
+        "search_query": state["search_queries"],
+        "web_research_result": split_research_topics(modified_text),
     }
 
 
-def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
+async def reflection(state: OverallState, config: RunnableConfig) -> OverallState:
     """LangGraph node that identifies knowledge gaps and generates potential follow-up queries.
 
     Analyzes the current summary to identify areas for further research and generates
@@ -155,21 +220,28 @@ def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
     state["research_loop_count"] = state.get("research_loop_count", 0) + 1
     reasoning_model = state.get("reasoning_model") or configurable.reasoning_model
 
-    # Format the prompt
-    current_date = get_current_date()
-    formatted_prompt = reflection_instructions.format(
-        current_date=current_date,
-        research_topic=get_research_topic(state["messages"]),
-        summaries="\n\n---\n\n".join(state["web_research_result"]),
-    )
+    # Format the prompt, in a worker thread when the summaries are large. The static
+    # instructions are sent unchanged as the system message so the prefix is cacheable.
+    def build_prompt() -> str:
+        return render_reflection_input(
+            research_topic=get_research_topic(state["messages"]),
+            summaries="\n\n---\n\n".join(state["web_research_result"]),
+        )
+
+    summaries_chars = sum(len(summary) for summary in state["web_research_result"])
+    if summaries_chars > LARGE_PROMPT_CHARS:
+        formatted_prompt = await asyncio.to_thread(build_prompt)
+    else:
+        formatted_prompt = build_prompt()
+
     # init Reasoning Model
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=1.0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
+    structured_llm = get_structured_llm(reasoning_model, 1.0, Reflection)
+    result = await structured_llm.ainvoke(
+        [
+            SystemMessage(content=render_reflection()),
+            HumanMessage(content=formatted_prompt),
+        ]
     )
-    result = llm.with_structured_output(Reflection).invoke(formatted_prompt)
 
     return {
         "is_sufficient": result.is_sufficient,
@@ -180,8 +252,36 @@ def reflection(state: OverallState, config: RunnableConfig) -> ReflectionState:
     }
 
 
+def get_max_research_loops(state: OverallState, config: RunnableConfig) -> int:
+    """Return the research loop budget from the run input or the configuration."""
+    if state.get("max_research_loops") is not None:
+        return state["max_research_loops"]
+    return Configuration.from_runnable_config(config).max_research_loops
+
+
+def continue_to_reflection(state: OverallState, config: RunnableConfig) -> str:
+    """LangGraph routing function that decides whether the web research needs reflection.
+
+    Reflection only matters if it can lead to another research loop. When the loop that
+    just finished is the last one allowed (always the case for "low" effort, which runs
+    a single loop) its result would be ignored, so the graph skips the reflection call
+    and goes straight to the final answer.
+
+    Args:
+        state: Current graph state containing the research loop count
+        config: Configuration for the runnable, including max_research_loops setting
+
+    Returns:
+        String literal indicating the next node to visit ("reflection" or "finalize_answer")
+    """
+    research_loop_count = state.get("research_loop_count") or 0
+    if research_loop_count + 1 >= get_max_research_loops(state, config):
+        return "finalize_answer"
+    return "reflection"
+
+
 def evaluate_research(
-    state: ReflectionState,
+    state: OverallState,
     config: RunnableConfig,
 ) -> OverallState:
     """LangGraph routing function that determines the next step in the research flow.
@@ -196,28 +296,26 @@ def evaluate_research(
     Returns:
         String literal indicating the next node to visit ("web_research" or "finalize_summary")
     """
-    configurable = Configuration.from_runnable_config(config)
-    max_research_loops = (
-        state.get("max_research_loops")
-        if state.get("max_research_loops") is not None
-        else configurable.max_research_loops
-    )
-    if state["is_sufficient"] or state["research_loop_count"] >= max_research_loops:
+    max_research_loops = get_max_research_loops(state, config)
+    if (
+        state["is_sufficient"]
+        or state["research_loop_count"] >= max_research_loops
+        or not state["follow_up_queries"]
+    ):
         return "finalize_answer"
     else:
         return [
             Send(
                 "web_research",
                 {
-                    "search_query": follow_up_query,
-                    "id": state["number_of_ran_queries"] + int(idx),
+                    "search_queries": state["follow_up_queries"],
+                    "id": state["number_of_ran_queries"],
                 },
             )
-            for idx, follow_up_query in enumerate(state["follow_up_queries"])
         ]
 
 
-def finalize_answer(state: OverallState, config: RunnableConfig):
+async def finalize_answer(state: OverallState, config: RunnableConfig):
     """LangGraph node that finalizes the research summary.
 
     Prepares the final output by deduplicating and formatting sources, then
@@ -235,32 +333,33 @@ def finalize_answer(state: OverallState, config: RunnableConfig):
 
     # Format the prompt
     current_date = get_current_date()
-    formatted_prompt = answer_instructions.format(
-        current_date=current_date,
+    instructions = render_answer(current_date=current_date)
+    formatted_prompt = render_answer_input(
         research_topic=get_research_topic(state["messages"]),
         summaries="\n---\n\n".join(state["web_research_result"]),
     )
 
     # init Reasoning Model, default to Gemini 2.5 Flash
-    llm = ChatGoogleGenerativeAI(
-        model=reasoning_model,
-        temperature=0,
-        max_retries=2,
-        api_key=os.getenv("GEMINI_API_KEY"),
-    )
-    result = llm.invoke(formatted_prompt)
+    llm = get_chat_llm(reasoning_model, 0)
+    messages = [
+        SystemMessage(content=instructions),
+        HumanMessage(content=formatted_prompt),
+    ]
+
+    # Stream the answer so clients using the "messages" stream mode receive tokens as
+    # they are generated; the short url replacement below runs once the stream ends.
+    answer_chunks = []
+    async for chunk in llm.astream(messages):
+        # Content is a list of parts when a text part carries a thought signature
+        answer_chunks.append(chunk.text)
 
     # Replace the short urls with the original urls and add all used urls to the sources_gathered
-    unique_sources = []
-    for source in state["sources_gathered"]:
-        if source["short_url"] in result.content:
-            result.content = result.content.replace(
-                source["short_url"], source["value"]
-            )
-            unique_sources.append(source)
+    content, unique_sources = await run_post_processing(
+        replace_short_urls, "".join(answer_chunks), state["sources_gathered"]
+    )
 
     return {
-        "messages": [AIMessage(content=result.content)],
+        "messages": [AIMessage(content=content)],
         "sources_gathered": unique_sources,
     }
 
@@ -279,10 +378,12 @@ builder.add_node("finalize_answer", finalize_answer)
 builder.add_edge(START, "generate_query")
 # Add conditional edge to continue with search queries in a parallel branch
 builder.add_conditional_edges(
-    "generate_query", continue_to_web_research, ["web_research"]
+    "generate_query", continue_to_web_research, ["web_research", "finalize_answer"]
+)
+# Reflect on the web research, unless this was the last loop allowed
+builder.add_conditional_edges(
+    "web_research", continue_to_reflection, ["reflection", "finalize_answer"]
 )
-# Reflect on the web research
-builder.add_edge("web_research", "reflection")
 # Evaluate the research
 builder.add_conditional_edges(
     "reflection", evaluate_research, ["web_research", "finalize_answer"]
@@ -1,9 +1,17 @@
-from datetime import datetime
+import functools
+from datetime import date
+from string import Formatter
 
 
 # Get current date in a readable format
 def get_current_date():
-    return datetime.now().strftime("%B %d, %Y")
+    return _format_date(date.today())
+
+
+# Only today's date is ever formatted, so strftime runs once per day
+@functools.lru_cache(maxsize=1)
+def _format_date(day: date) -> str:
+    return day.strftime("%B %d, %Y")
 
 
 query_writer_instructions = """Your goal is to generate sophisticated and diverse web search queries. These queries are intended for an advanced automated web research tool capable of analyzing complex results, following links, and synthesizing information.
@@ -29,25 +37,27 @@ Topic: What revenue grew more last year apple stock or the number of people buyi
     "rationale": "To answer this comparative growth question accurately, we need specific data points on Apple's stock performance and iPhone sales metrics. These queries target the precise financial information needed: company revenue trends, product-specific unit sales figures, and stock price movement over the same fiscal period for direct comparison.",
     "query": ["Apple total revenue growth fiscal year 2024", "iPhone unit sales growth fiscal year 2024", "Apple stock price growth fiscal year 2024"],
 }}
-```
+```"""
 
-Context: {research_topic}"""
+query_writer_input = """Context: {research_topic}"""
 
 
-web_searcher_instructions = """Conduct targeted Google Searches to gather the most recent, credible information on "{research_topic}" and synthesize it into a verifiable text artifact.
+web_searcher_instructions = """Conduct targeted Google Searches to gather the most recent, credible information on each of the research topics below and synthesize it into one verifiable text artifact per topic.
 
 Instructions:
 - Query should ensure that the most current information is gathered. The current date is {current_date}.
-- Conduct multiple, diverse searches to gather comprehensive information.
+- Conduct multiple, diverse searches for every topic to gather comprehensive information.
 - Consolidate key findings while meticulously tracking the source(s) for each specific piece of information.
-- The output should be a well-written summary or report based on your search findings. 
+- The output for each topic should be a well-written summary or report based on your search findings. 
 - Only include the information found in the search results, don't make up any information.
+- Cover the topics in the given order and start the section for each topic with a line containing only its marker, e.g. "[[TOPIC 1]]".
+"""
 
-Research Topic:
-{research_topic}
+web_searcher_input = """Research Topics:
+{research_topics}
 """
 
-reflection_instructions = """You are an expert research assistant analyzing summaries about "{research_topic}".
+reflection_instructions = """You are an expert research assistant analyzing summaries about the research topic given below.
 
 Instructions:
 - Identify knowledge gaps or areas that need deeper exploration and generate a follow-up query. (1 or multiple).
@@ -73,7 +83,10 @@ Example:
 }}
 ```
 
-Reflect carefully on the Summaries to identify knowledge gaps and produce a follow-up query. Then, produce your output following this JSON format:
+Reflect carefully on the Summaries to identify knowledge gaps and produce a follow-up query. Then, produce your output following this JSON format."""
+
+reflection_input = """Research Topic:
+{research_topic}
 
 Summaries:
 {summaries}
@@ -87,10 +100,111 @@ Instructions:
 - You have access to all the information gathered from the previous steps.
 - You have access to the user's question.
 - Generate a high-quality answer to the user's question based on the provided summaries and the user's question.
-- you MUST include all the citations from the summaries in the answer correctly.
+- you MUST include all the citations from the summaries in the answer correctly."""
 
-User Context:
+answer_input = """User Context:
 - {research_topic}
 
 Summaries:
 {summaries}"""
+
+
+class _PromptTemplate:
+    """A format template parsed once into its literal text chunks.
+
+    Parsing checks that the fields appear in the template exactly in the given
+    order; escaped braces are already resolved in the chunks. The render helpers
+    below interpolate the chunks directly.
+    """
+
+    def __init__(self, template: str, *field_names: str) -> None:
+        chunks = [""]
+        found = []
+        for literal, field_name, _, _ in Formatter().parse(template):
+            chunks[-1] += literal
+            if field_name is not None:
+                found.append(field_name)
+                chunks.append("")
+        if tuple(found) != field_names:
+            raise ValueError(
+                f"Expected template fields {field_names}, found {tuple(found)}"
+            )
+        # One more literal chunk than there are fields
+        self.chunks = tuple(chunks)
+
+
+# The templates are parsed once at import; they are static and never invalidated
+QUERY_WRITER_TEMPLATE = _PromptTemplate(
+    query_writer_instructions, "number_queries", "current_date"
+)
+# number_queries only ever takes a few small values, so the query writer prompt is
+# pre-rendered for each of them and only the date is filled in per call
+_QUERY_WRITER_BY_NUMBER = {
+    number_queries: _PromptTemplate(
+        query_writer_instructions.replace("{number_queries}", str(number_queries)),
+        "current_date",
+    )
+    for number_queries in range(1, 11)
+}
+QUERY_WRITER_INPUT_TEMPLATE = _PromptTemplate(query_writer_input, "research_topic")
+WEB_SEARCHER_TEMPLATE = _PromptTemplate(web_searcher_instructions, "current_date")
+WEB_SEARCHER_INPUT_TEMPLATE = _PromptTemplate(web_searcher_input, "research_topics")
+REFLECTION_TEMPLATE = _PromptTemplate(reflection_instructions)
+REFLECTION_INPUT_TEMPLATE = _PromptTemplate(
+    reflection_input, "research_topic", "summaries"
+)
+ANSWER_TEMPLATE = _PromptTemplate(answer_instructions, "current_date")
+ANSWER_INPUT_TEMPLATE = _PromptTemplate(answer_input, "research_topic", "summaries")
+
+
+# The render helpers interpolate the cached chunks with f-strings, which compile to a
+# single BUILD_STRING instead of going through the str.format machinery per call.
+def render_query_writer(number_queries: int, current_date: str) -> str:
+    """Render query_writer_instructions."""
+    template = _QUERY_WRITER_BY_NUMBER.get(number_queries)
+    if template is None:
+        c = QUERY_WRITER_TEMPLATE.chunks
+        return f"{c[0]}{number_queries}{c[1]}{current_date}{c[2]}"
+    c = template.chunks
+    return f"{c[0]}{current_date}{c[1]}"
+
+
+def render_query_writer_input(research_topic: str) -> str:
+    """Render query_writer_input."""
+    c = QUERY_WRITER_INPUT_TEMPLATE.chunks
+    return f"{c[0]}{research_topic}{c[1]}"
+
+
+def render_web_searcher(current_date: str) -> str:
+    """Render web_searcher_instructions."""
+    c = WEB_SEARCHER_TEMPLATE.chunks
+    return f"{c[0]}{current_date}{c[1]}"
+
+
+def render_web_searcher_input(research_topics: str) -> str:
+    """Render web_searcher_input."""
+    c = WEB_SEARCHER_INPUT_TEMPLATE.chunks
+    return f"{c[0]}{research_topics}{c[1]}"
+
+
+def render_reflection() -> str:
+    """Render reflection_instructions, which have no fields."""
+    return REFLECTION_TEMPLATE.chunks[0]
+
+
+def render_reflection_input(research_topic: str, summaries: str) -> str:
+    """Render reflection_input."""
+    c = REFLECTION_INPUT_TEMPLATE.chunks
+    return f"{c[0]}{research_topic}{c[1]}{summaries}{c[2]}"
+
+
+def render_answer(current_date: str) -> str:
+    """Render answer_instructions."""
+    c = ANSWER_TEMPLATE.chunks
+    return f"{c[0]}{current_date}{c[1]}"
+
+
+def render_answer_input(research_topic: str, summaries: str) -> str:
+    """Render answer_input."""
+    c = ANSWER_INPUT_TEMPLATE.chunks
+    return f"{c[0]}{research_topic}{c[1]}{summaries}{c[2]}"
@@ -1,3 +1,4 @@
+import re
 from typing import Any, Dict, List
 from langchain_core.messages import AnyMessage, AIMessage, HumanMessage
 
@@ -8,15 +9,52 @@ def get_research_topic(messages: List[AnyMessage]) -> str:
     """
     # check if request has a history and combine the messages into a single string
     if len(messages) == 1:
-        research_topic = messages[-1].content
-    else:
-        research_topic = ""
-        for message in messages:
-            if isinstance(message, HumanMessage):
-                research_topic += f"User: {message.content}\n"
-            elif isinstance(message, AIMessage):
-                research_topic += f"Assistant: {message.content}\n"
-    return research_topic
+        return messages[-1].content
+    return "".join(
+        f"User: {message.content}\n"
+        if isinstance(message, HumanMessage)
+        else f"Assistant: {message.content}\n"
+        for message in messages
+        if isinstance(message, (HumanMessage, AIMessage))
+    )
+
+
+# Matches the "[[TOPIC n]]" lines that delimit sections in a batched web research answer.
+# Models sometimes copy the input format and keep the topic on the marker line, so any
+# trailing text is captured as the section heading.
+_TOPIC_MARKER_RE = re.compile(
+    r"^[\s#*]*\[\[TOPIC \d+\]\][ \t*:.\-]*(?P<heading>[^\n]*)$", re.MULTILINE
+)
+
+
+def number_research_topics(queries: List[str]) -> str:
+    """
+    Render the search queries as a numbered topic list for the batched web searcher prompt.
+    """
+    return "\n".join(f"[[TOPIC {idx}]] {query}" for idx, query in enumerate(queries, 1))
+
+
+def split_research_topics(text: str) -> List[str]:
+    """
+    Split a batched web research answer into one summary per research topic.
+
+    Sections are delimited by the "[[TOPIC n]]" marker lines requested in the web searcher
+    prompt; text after a marker on the same line is kept as the first line of its section.
+    If the model omitted the markers the whole answer is returned as a single summary.
+    """
+    markers = list(_TOPIC_MARKER_RE.finditer(text))
+    if not markers:
+        return [text.strip()]
+
+    ends = [marker.start() for marker in markers[1:]] + [len(text)]
+    sections = []
+    for marker, end in zip(markers, ends):
+        heading = marker.group("heading").rstrip(" \t*")
+        sections.append(f"{heading}{text[marker.end() : end]}".strip())
+    preamble = text[: markers[0].start()].strip()
+    if preamble:
+        sections.insert(0, preamble)
+    return [section for section in sections if section]
 
 
 def resolve_urls(urls_to_resolve: List[Any], id: int) -> Dict[str, str]:
@@ -24,14 +62,14 @@ def resolve_urls(urls_to_resolve: List[Any], id: int) -> Dict[str, str]:
     Create a map of the vertex ai search urls (very long) to a short url with a unique id for each url.
     Ensures each original URL gets a consistent shortened form while maintaining uniqueness.
     """
-    prefix = f"https://vertexaisearch.cloud.google.com/id/"
-    urls = [site.web.uri for site in urls_to_resolve]
+    prefix = f"https://vertexaisearch.cloud.google.com/id/{id}-"
 
     # Create a dictionary that maps each unique URL to its first occurrence index
     resolved_map = {}
-    for idx, url in enumerate(urls):
+    for idx, site in enumerate(urls_to_resolve):
+        url = site.web.uri
         if url not in resolved_map:
-            resolved_map[url] = f"{prefix}{id}-{idx}"
+            resolved_map[url] = f"{prefix}{idx}"
 
     return resolved_map
 
@@ -50,29 +88,71 @@ def insert_citation_markers(text, citations_list):
     Returns:
         str: The text with citation markers inserted.
     """
-    # Sort citations by end_index in descending order.
-    # If end_index is the same, secondary sort by start_index descending.
-    # This ensures that insertions at the end of the string don't affect
-    # the indices of earlier parts of the string that still need to be processed.
+    # Sort citations by end_index (and start_index for ties) in ascending order so the
+    # text can be copied once, segment by segment, with each marker appended at its
+    # end_index. This avoids rebuilding the whole string for every citation.
+    # Sorting the reversed list keeps the previous marker order for exact ties.
     sorted_citations = sorted(
-        citations_list, key=lambda c: (c["end_index"], c["start_index"]), reverse=True
+        reversed(citations_list), key=lambda c: (c["end_index"], c["start_index"])
     )
 
-    modified_text = text
+    parts = []
+    last_idx = 0
     for citation_info in sorted_citations:
-        # These indices refer to positions in the *original* text,
-        # but since we iterate from the end, they remain valid for insertion
-        # relative to the parts of the string already processed.
+        # These indices refer to positions in the *original* text
         end_idx = citation_info["end_index"]
-        marker_to_insert = ""
-        for segment in citation_info["segments"]:
-            marker_to_insert += f" [{segment['label']}]({segment['short_url']})"
-        # Insert the citation marker at the original end_idx position
-        modified_text = (
-            modified_text[:end_idx] + marker_to_insert + modified_text[end_idx:]
+        parts.append(text[last_idx:end_idx])
+        parts.extend(
+            f" [{segment['label']}]({segment['short_url']})"
+            for segment in citation_info["segments"]
         )
+        last_idx = end_idx
+    parts.append(text[last_idx:])
+
+    return "".join(parts)
+
+
+def replace_short_urls(text, sources):
+    """
+    Replaces the short urls in a text with the original urls of the sources.
+
+    Args:
+        text (str): The text containing short urls.
+        sources (list): The gathered sources, each a dictionary with
+                        'short_url' and 'value' (the original url) keys.
+
+    Returns:
+        tuple: The text with all short urls replaced, and the list of sources
+               whose short url occurred in the text (first source per short url,
+               in gathering order).
+    """
+    sources_by_short_url = {}
+    for source in sources:
+        if source.get("short_url"):
+            sources_by_short_url.setdefault(source["short_url"], source)
+    if not sources_by_short_url:
+        return text, []
+
+    # Longest first so that e.g. ".../id/1-1" never matches inside ".../id/1-10"
+    short_url_pattern = re.compile(
+        "|".join(
+            re.escape(short_url)
+            for short_url in sorted(sources_by_short_url, key=len, reverse=True)
+        )
+    )
+    used_short_urls = set()
+
+    def replace_short_url(match):
+        used_short_urls.add(match.group(0))
+        return sources_by_short_url[match.group(0)]["value"]
 
-    return modified_text
+    text = short_url_pattern.sub(replace_short_url, text)
+    unique_sources = [
+        source
+        for short_url, source in sources_by_short_url.items()
+        if short_url in used_short_urls
+    ]
+    return text, unique_sources
 
 
 def get_citations(response, resolved_urls_map):
@@ -119,6 +199,8 @@ def get_citations(response, resolved_urls_map):
     ):
         return citations
 
+    # Look the chunks up once instead of walking the metadata for every chunk index
+    grounding_chunks = candidate.grounding_metadata.grounding_chunks or []
     for support in candidate.grounding_metadata.grounding_supports:
         citation = {}
 
@@ -148,11 +230,11 @@ def get_citations(response, resolved_urls_map):
         ):
             for ind in support.grounding_chunk_indices:
                 try:
-                    chunk = candidate.grounding_metadata.grounding_chunks[ind]
+                    chunk = grounding_chunks[ind]
                     resolved_url = resolved_urls_map.get(chunk.web.uri, None)
                     citation["segments"].append(
                         {
-                            "label": chunk.web.title.split(".")[:-1][0],
+                            "label": chunk.web.title.partition(".")[0],
                             "short_url": resolved_url,
                             "value": chunk.web.uri,
                         }
@@ -0,0 +1,4 @@
+import os
+
+# graph.py fails fast without an API key; the tests never reach the real API.
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
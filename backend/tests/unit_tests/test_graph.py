@@ -0,0 +1,168 @@
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.messages import AIMessageChunk, HumanMessage
+
+from agent.tools_and_schemas import Reflection, SearchQueryList
+
+graph_module = importlib.import_module("agent.graph")
+
+
+def fake_grounded_response(contents: str):
+    """Build a grounded response with one cited section per requested topic."""
+    topics = contents.count("[[TOPIC ")
+    text = "\n".join(f"[[TOPIC {i}]]\nsummary {i}" for i in range(1, topics + 1))
+    chunk = SimpleNamespace(
+        web=SimpleNamespace(uri="https://example.com/page", title="example.com")
+    )
+    support = SimpleNamespace(
+        segment=SimpleNamespace(start_index=0, end_index=len(text)),
+        grounding_chunk_indices=[0],
+    )
+    metadata = SimpleNamespace(grounding_chunks=[chunk], grounding_supports=[support])
+    return SimpleNamespace(
+        text=text, candidates=[SimpleNamespace(grounding_metadata=metadata)]
+    )
+
+
+class FakeModels:
+    def __init__(self):
+        self.calls = []
+        self.reflections = 0
+        self.queries = ["q1", "q2"]
+        # Follow-up queries returned by each successive reflection, then none
+        self.follow_up_rounds = [["f1"]]
+
+    async def generate_content(self, *, model, contents, config):
+        self.calls.append(contents)
+        return fake_grounded_response(contents)
+
+
+class FakeStructuredLLM:
+    def __init__(self, models):
+        self.models = models
+
+    def invoke(self, messages):
+        return SearchQueryList(query=self.models.queries, rationale="")
+
+    async def ainvoke(self, messages):
+        rounds = self.models.follow_up_rounds
+        follow_up_queries = (
+            rounds[self.models.reflections]
+            if self.models.reflections < len(rounds)
+            else []
+        )
+        self.models.reflections += 1
+        return Reflection(
+            is_sufficient=False,
+            knowledge_gap="gap",
+            follow_up_queries=follow_up_queries,
+        )
+
+
+class FakeChatLLM:
+    async def astream(self, messages, **kwargs):
+        yield AIMessageChunk(content="final ")
+        # Thinking models return list content for text parts with a thought signature
+        yield AIMessageChunk(
+            content=[{"type": "text", "text": "answer", "extras": {"signature": "sig"}}]
+        )
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    models = FakeModels()
+    monkeypatch.setattr(
+        graph_module,
+        "genai_client",
+        SimpleNamespace(aio=SimpleNamespace(models=models)),
+    )
+    monkeypatch.setattr(
+        graph_module,
+        "get_structured_llm",
+        lambda model, temperature, schema: FakeStructuredLLM(models),
+    )
+    monkeypatch.setattr(
+        graph_module, "get_chat_llm", lambda model, temperature: FakeChatLLM()
+    )
+    return models
+
+
+def run_graph(max_research_loops: int) -> dict:
+    return asyncio.run(
+        graph_module.graph.ainvoke(
+            {
+                "messages": [HumanMessage(content="What is new?")],
+                "initial_search_query_count": 2,
+                "max_research_loops": max_research_loops,
+                "reasoning_model": "test-model",
+            }
+        )
+    )
+
+
+def test_two_research_loops_accumulate_each_result_once(fake_models):
+    state = run_graph(max_research_loops=2)
+
+    # One batched call per loop: the two initial queries, then the follow-up
+    assert len(fake_models.calls) == 2
+    assert fake_models.reflections == 1
+    assert state["search_query"] == ["q1", "q2", "f1"]
+    assert [result.split(" [")[0] for result in state["web_research_result"]] == [
+        "summary 1",
+        "summary 2",
+        "summary 1",
+    ]
+    # One cited source per batch, each with its own batch id
+    assert [source["short_url"][-3:] for source in state["sources_gathered"]] == [
+        "0-0",
+        "2-0",
+    ]
+    assert state["follow_up_queries"] == ["f1"]
+    assert state["number_of_ran_queries"] == 2
+    assert state["research_loop_count"] == 1
+    assert state["messages"][-1].content == "final answer"
+
+
+def test_single_loop_skips_reflection(fake_models):
+    state = run_graph(max_research_loops=1)
+
+    assert len(fake_models.calls) == 1
+    assert fake_models.reflections == 0
+    assert state["search_query"] == ["q1", "q2"]
+    assert len(state["web_research_result"]) == 2
+    assert len(state["sources_gathered"]) == 1
+
+
+def test_no_queries_finalizes_without_searching(fake_models):
+    fake_models.queries = []
+    state = run_graph(max_research_loops=2)
+
+    assert fake_models.calls == []
+    assert fake_models.reflections == 0
+    assert state["messages"][-1].content == "final answer"
+
+
+def test_no_follow_up_queries_finalizes(fake_models):
+    fake_models.follow_up_rounds = [[]]
+    state = run_graph(max_research_loops=3)
+
+    assert len(fake_models.calls) == 1
+    assert fake_models.reflections == 1
+    assert state["search_query"] == ["q1", "q2"]
+    assert state["messages"][-1].content == "final answer"
+
+
+def test_follow_up_batches_hold_only_the_latest_reflection(fake_models):
+    fake_models.follow_up_rounds = [["f1"], ["f2"], []]
+    state = run_graph(max_research_loops=5)
+
+    # Each loop researches only the newest follow-ups, and an empty list finalizes
+    assert len(fake_models.calls) == 3
+    assert fake_models.reflections == 3
+    assert state["search_query"] == ["q1", "q2", "f1", "f2"]
+    assert state["follow_up_queries"] == []
+    assert state["number_of_ran_queries"] == 4
+    assert state["messages"][-1].content == "final answer"
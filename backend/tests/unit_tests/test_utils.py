@@ -0,0 +1,101 @@
+from agent.utils import (
+    insert_citation_markers,
+    number_research_topics,
+    replace_short_urls,
+    split_research_topics,
+)
+
+SHORT_URL = "https://vertexaisearch.cloud.google.com/id/"
+
+
+def source(short_id: str, value: str) -> dict:
+    return {"label": value, "short_url": SHORT_URL + short_id, "value": value}
+
+
+def test_split_research_topics_on_marker_lines():
+    text = "[[TOPIC 1]]\nsummary 1\n\n**[[TOPIC 2]]**\nsummary 2\n"
+
+    assert split_research_topics(text) == ["summary 1", "summary 2"]
+
+
+def test_split_research_topics_keeps_text_after_the_marker():
+    queries = ["Apple revenue", "Apple margins"]
+    # The model copied the input format, topic included, onto the marker lines
+    text = (
+        number_research_topics(queries).replace("\n", "\nsummary 1\n") + "\nsummary 2"
+    )
+
+    assert split_research_topics(text) == [
+        "Apple revenue\nsummary 1",
+        "Apple margins\nsummary 2",
+    ]
+
+
+def test_split_research_topics_with_punctuated_markers():
+    text = "[[TOPIC 1]]: Apple revenue grew.\nMore detail.\n**[[TOPIC 2]] - Margins**\nFlat."
+
+    assert split_research_topics(text) == [
+        "Apple revenue grew.\nMore detail.",
+        "Margins\nFlat.",
+    ]
+
+
+def test_split_research_topics_without_markers():
+    assert split_research_topics("  one summary \n") == ["one summary"]
+
+
+def test_replace_short_urls_prefers_the_longest_match():
+    sources = [
+        source("1-1", "https://one.example"),
+        source("1-10", "https://ten.example"),
+    ]
+    text = f"[a]({SHORT_URL}1-10) [b]({SHORT_URL}1-1)"
+
+    content, used = replace_short_urls(text, sources)
+
+    assert content == "[a](https://ten.example) [b](https://one.example)"
+    assert used == sources
+
+
+def test_replace_short_urls_keeps_the_first_source_per_short_url():
+    first = source("0-2", "https://first.example")
+    sources = [
+        source("0-1", "https://unused.example"),
+        source("0-3", "https://later.example"),
+        first,
+        source("0-2", "https://duplicate.example"),
+    ]
+    text = f"[x]({SHORT_URL}0-2) [y]({SHORT_URL}0-3) [z]({SHORT_URL}0-2)"
+
+    content, used = replace_short_urls(text, sources)
+
+    assert content == (
+        "[x](https://first.example) [y](https://later.example) [z](https://first.example)"
+    )
+    # Only sources cited in the text, in gathering order
+    assert used == [sources[1], first]
+
+
+def citation(start_index: int, end_index: int, *labels: str) -> dict:
+    return {
+        "start_index": start_index,
+        "end_index": end_index,
+        "segments": [{"label": label, "short_url": f"u{label}"} for label in labels],
+    }
+
+
+def test_insert_citation_markers_keeps_the_marker_order_on_ties():
+    text = "Alpha beta. Gamma."
+    citations = [
+        citation(0, 11, "a"),
+        citation(0, 11, "b"),
+        citation(6, 11, "c"),
+        citation(12, 18, "d", "e"),
+        citation(0, 5, "f"),
+    ]
+
+    # Same order as inserting the markers one by one from the end of the text: exact
+    # ties come out reversed, and a smaller start_index comes first at the same end
+    assert insert_citation_markers(text, citations) == (
+        "Alpha [f](uf) beta. [b](ub) [a](ua) [c](uc) Gamma. [d](ud) [e](ue)"
+    )